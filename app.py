@@ -1,20 +1,81 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, BackgroundTasks, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import List, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import json
 import os
 import shutil
+import sys
+import time
+import uuid
 import uvicorn
-from pydantic import BaseModel
-from study import StudyDocumentProcessor, StudyRAG
+from pydantic import BaseModel, Field
+from study import StudyDocumentProcessor, StudyRAG, EMBEDDING_CACHE
+from query_cache import QueryCache
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Cache for /query and /search results, invalidated whenever documents change
+cache = QueryCache(max_size=2000, ttl_seconds=300)
+
+# RAG components, created per worker process on startup
+processor: Optional[StudyDocumentProcessor] = None
+rag: Optional[StudyRAG] = None
+
+def _warm_up():
+    """Open the Chroma collection and make one embedding call so the first query is not cold"""
+    try:
+        rag.count()
+        rag.search_documents("warmup", k=1)
+    except Exception as e:
+        print(f"Warmup failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global processor, rag
+    processor = StudyDocumentProcessor()
+    rag = StudyRAG()
+    await asyncio.to_thread(_recover_jobs)
+    await asyncio.to_thread(_warm_up)
+    yield
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Study RAG API",
     description="API for the Study RAG application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Prefix for 500 details, keyed by method and first path segment
+ERROR_CONTEXT = {
+    ("POST", "/query"): "Error processing query",
+    ("POST", "/upload"): "Error uploading file",
+    ("GET", "/documents"): "Error listing documents",
+    ("DELETE", "/documents"): "Error deleting document",
+    ("GET", "/search"): "Error searching documents",
+}
+
+# Errors that aren't HTTPExceptions are reported as 500s. This is registered
+# before CORSMiddleware so it runs inside it and error responses keep CORS headers.
+@app.middleware("http")
+async def unhandled_error_middleware(request: Request, call_next):
+    try:
+        return await call_next(request)
+    except Exception as e:
+        path = "/" + request.url.path.strip("/").split("/", 1)[0]
+        context = ERROR_CONTEXT.get((request.method, path))
+        detail = f"{context}: {str(e)}" if context else str(e)
+        return ORJSONResponse(status_code=500, content={"detail": detail})
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,23 +85,49 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Initialize the RAG components
-processor = StudyDocumentProcessor()
-rag = StudyRAG()
+# Compress JSON responses; brotli-asgi falls back to gzip for clients without br
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=1024)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+SUPPORTED_EXTENSIONS = frozenset({'.pdf', '.txt', '.json', '.ppt', '.pptx'})
+SUPPORTED_EXTENSIONS_TUPLE = tuple(SUPPORTED_EXTENSIONS)
+
+# Uploads are copied to disk in large chunks to keep syscall count low
+UPLOAD_BUFFER_SIZE = 4 * 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+# Upload job records live on disk so any worker can answer status polls
+JOBS_DIR = "upload_jobs"
+# Finished job records are deleted once they are this old
+JOB_TTL_SECONDS = 24 * 3600
 
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
     question: str
-    max_sources: int = 3
+    # Also the number of chunks placed in the prompt, so bounded like /search's limit
+    max_sources: int = Field(3, ge=1, le=20)
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[dict]
 
+class BatchQueryRequest(BaseModel):
+    items: List[QueryRequest] = Field(..., min_length=1, max_length=100)
+    use_cache: bool = True
+
 class UploadResponse(BaseModel):
+    filename: str
+    job_id: str
+    status: str
+
+class UploadStatusResponse(BaseModel):
+    job_id: str
     filename: str
     status: str
     sections_processed: int = 0
+    detail: Optional[str] = None
 
 # Routes
 @app.get("/")
@@ -52,118 +139,280 @@ async def query_rag(request: QueryRequest):
     """
     Query the RAG system with a question
     """
+    key = ("query", request.question.strip().lower(), request.max_sources)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Retrieval and generation block, so keep them off the event loop
+    result = await asyncio.to_thread(rag.get_response_with_sources, request.question, k=request.max_sources)
+
+    # Don't cache failed generations
+    if not result["answer"].startswith("Error: "):
+        cache.put(key, result)
+
+    return result
+
+def _answer_questions(questions: dict, use_cache: bool = True) -> dict:
+    """Answer questions in parallel, mapping each key to its result or exception"""
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {
+            executor.submit(rag.get_response_with_sources, question, k=k, use_cache=use_cache): key
+            for key, (question, k) in questions.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                outcomes[key] = future.result()
+            except Exception as e:
+                outcomes[key] = e
+    return outcomes
+
+@app.post("/batch_query")
+async def batch_query(request: BatchQueryRequest):
+    """
+    Query the RAG system with several questions at once
+    """
+    # Deduplicate by normalized question and split into cache hits and misses
+    keys = [
+        ("query", item.question.strip().lower(), item.max_sources)
+        for item in request.items
+    ]
+    answers = {}
+    pending = {}
+    for item, key in zip(request.items, keys):
+        if key in answers or key in pending:
+            continue
+        cached = cache.get(key) if request.use_cache else None
+        if cached is not None:
+            answers[key] = cached
+        else:
+            pending[key] = (item.question, item.max_sources)
+
+    outcomes = await asyncio.to_thread(_answer_questions, pending, request.use_cache) if pending else {}
+
+    results = []
+    processed = failed = cached_count = 0
+    for item, key in zip(request.items, keys):
+        if key in answers:
+            result = answers[key]
+            cached_count += 1
+        else:
+            result = outcomes[key]
+            if isinstance(result, Exception) or result["answer"].startswith("Error: "):
+                error = str(result) if isinstance(result, Exception) else result["answer"]
+                results.append({"question": item.question, "status": "error", "detail": error})
+                failed += 1
+                continue
+            cache.put(key, result)
+            processed += 1
+        results.append({"question": item.question, "status": "success", **result})
+
+    return {
+        "results": results,
+        "summary": {
+            "total": len(request.items),
+            "processed": processed,
+            "failed": failed,
+            "cached": cached_count
+        }
+    }
+
+def _save_upload(source, file_path: str):
+    """Copy an uploaded file object to disk, in kernel space when it is already backed by a file"""
+    with open(file_path, "wb", buffering=UPLOAD_BUFFER_SIZE) as buffer:
+        # Starlette spools small uploads in memory and rolls larger ones over to a temp file
+        if sys.platform.startswith("linux") and getattr(source, "_rolled", False):
+            src_fd = source.fileno()
+            offset = source.tell()
+            size = os.fstat(src_fd).st_size
+            while offset < size:
+                sent = os.sendfile(buffer.fileno(), src_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        else:
+            shutil.copyfileobj(source, buffer, length=UPLOAD_BUFFER_SIZE)
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _write_job(job_id: str, **fields):
+    """Atomically write the status record for an upload job"""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    record = {"job_id": job_id, **fields}
+    tmp_path = _job_path(job_id) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp_path, _job_path(job_id))
+
+def _iter_jobs():
+    """Yield (path, record) for every readable job record"""
+    if not os.path.exists(JOBS_DIR):
+        return
+    with os.scandir(JOBS_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    yield entry, json.load(f)
+            except (OSError, ValueError):
+                continue
+
+def _prune_jobs():
+    """Delete finished job records older than JOB_TTL_SECONDS"""
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for entry, record in _iter_jobs():
+        if record.get("status") in ("done", "failed") and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+def _recover_jobs():
+    """On startup, fail jobs a previous server left unfinished and prune old records"""
+    for _, record in list(_iter_jobs()):
+        if record.get("status") in ("queued", "running"):
+            _write_job(
+                record["job_id"],
+                filename=record.get("filename", ""),
+                status="failed",
+                detail="Server restarted before the document was processed"
+            )
+    _prune_jobs()
+
+def _process_upload(job_id: str, filename: str, file_path: str):
+    """Ingest an uploaded document and record how many sections were added"""
+    _write_job(job_id, filename=filename, status="running")
     try:
-        result = rag.get_response_with_sources(request.question)
-        
-        # Limit the number of sources if requested
-        if len(result["sources"]) > request.max_sources:
-            result["sources"] = result["sources"][:request.max_sources]
-            
-        return result
+        sections_processed = processor.process_document(file_path)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+        _write_job(job_id, filename=filename, status="failed", detail=f"Error processing document: {str(e)}")
+        return
+    finally:
+        # Batches stored before a failure still change query results
+        cache.clear()
+        _prune_jobs()
+    _write_job(job_id, filename=filename, status="done", sections_processed=sections_processed)
 
-@app.post("/upload", response_model=UploadResponse)
-async def upload_document(file: UploadFile = File(...)):
+@app.post("/upload", response_model=UploadResponse, status_code=202)
+async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
     Upload a document to be processed by the RAG system
     """
+    # Check file extension before writing anything to disk
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Unsupported file type: {file_extension}. Supported types: .pdf, .txt, .json, .ppt, .pptx"
+        )
+
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large: {file.size} bytes. Maximum size: {MAX_UPLOAD_SIZE} bytes"
+        )
+
+    # Create directory if it doesn't exist
+    os.makedirs("study_materials", exist_ok=True)
+
+    # Save the uploaded file
+    file_path = os.path.join("study_materials", file.filename)
+
+    await asyncio.to_thread(_save_upload, file.file, file_path)
+
+    # Process the document in the background and let the client poll for the result
+    job_id = uuid.uuid4().hex
+    _write_job(job_id, filename=file.filename, status="queued")
+    background_tasks.add_task(_process_upload, job_id, file.filename, file_path)
+
+    return {"filename": file.filename, "job_id": job_id, "status": "queued"}
+
+@app.get("/upload/status/{job_id}", response_model=UploadStatusResponse)
+async def upload_status(job_id: str):
+    """
+    Report the processing status of an uploaded document
+    """
     try:
-        # Create directory if it doesn't exist
-        os.makedirs("study_materials", exist_ok=True)
-        
-        # Save the uploaded file
-        file_path = os.path.join("study_materials", file.filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Check file extension
-        file_extension = os.path.splitext(file_path)[1].lower()
-        if file_extension not in ['.pdf', '.txt', '.json', '.ppt', '.pptx']:
-            os.remove(file_path)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file type: {file_extension}. Supported types: .pdf, .txt, .json, .ppt, .pptx"
-            )
-        
-        # Process the document
-        try:
-            # Save the current count of documents in the vector store
-            current_count = len(rag.vectorstore.get()["ids"]) if rag.vectorstore.get() else 0
-            
-            # Process the document
-            processor.process_document(file_path)
-            
-            # Get the new count to calculate how many sections were processed
-            new_count = len(rag.vectorstore.get()["ids"]) if rag.vectorstore.get() else 0
-            sections_processed = new_count - current_count
-            
-            return {
-                "filename": file.filename,
-                "status": "success",
-                "sections_processed": sections_processed
-            }
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+        with open(_job_path(uuid.UUID(hex=job_id).hex)) as f:
+            return json.load(f)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail=f"Upload job {job_id} not found")
+
+def _scan_documents(directory: str) -> List[dict]:
+    """Collect name, size and mtime for supported files using a single directory scan"""
+    documents = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(SUPPORTED_EXTENSIONS_TUPLE):
+                continue
+            stat = entry.stat()
+            documents.append({
+                "filename": entry.name,
+                "size_bytes": stat.st_size,
+                "last_modified": stat.st_mtime
+            })
+    return documents
 
 @app.get("/documents")
 async def list_documents():
     """
     List all documents available in the study materials
     """
-    try:
-        if not os.path.exists("study_materials"):
-            return {"documents": []}
-            
-        documents = []
-        for filename in os.listdir("study_materials"):
-            if filename.endswith(('.pdf', '.txt', '.json', '.ppt', '.pptx')):
-                file_path = os.path.join("study_materials", filename)
-                file_size = os.path.getsize(file_path)
-                file_modified = os.path.getmtime(file_path)
-                
-                documents.append({
-                    "filename": filename,
-                    "size_bytes": file_size,
-                    "last_modified": file_modified
-                })
-                
-        return {"documents": documents}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
+    if not os.path.exists("study_materials"):
+        return {"documents": []}
+
+    documents = await asyncio.to_thread(_scan_documents, "study_materials")
+    return {"documents": documents}
 
 @app.delete("/documents/{filename}")
 async def delete_document(filename: str):
     """
     Delete a document from the study materials
     """
-    try:
-        file_path = os.path.join("study_materials", filename)
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail=f"Document {filename} not found")
-            
-        os.remove(file_path)
-        
-        return {"filename": filename, "status": "deleted"}
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+    file_path = os.path.join("study_materials", filename)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"Document {filename} not found")
+
+    os.remove(file_path)
+    cache.clear()
+
+    return {"filename": filename, "status": "deleted"}
 
 @app.get("/search")
 async def search_documents(query: str = Query(..., min_length=1), limit: int = Query(5, ge=1, le=20)):
     """
     Search for relevant documents without generating an answer
     """
-    try:
-        results = rag.search_documents(query, k=limit)
-        return {"query": query, "results": results}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+    # Raw query: embeddings are case-sensitive, so normalizing could serve the wrong results
+    key = ("search", query, limit)
+    results = cache.get(key)
+    if results is None:
+        results = await asyncio.to_thread(rag.search_documents, query, k=limit)
+        cache.put(key, results)
+    return {"query": query, "results": results}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Report hit/miss/eviction counters for the query and embedding caches
+    """
+    return {"query": cache.stats(), "embeddings": EMBEDDING_CACHE.stats()}
 
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # DEV=1 runs a single auto-reloading worker. The Chroma and FAISS stores are
+    # embedded and not process-safe, so only raise WEB_CONCURRENCY in front of a
+    # store that is shared across processes.
+    dev = os.environ.get("DEV") == "1"
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        reload=dev,
+        workers=None if dev else int(os.environ.get("WEB_CONCURRENCY", "1"))
+    )
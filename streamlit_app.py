@@ -1,13 +1,33 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
 import os
 import json
 from datetime import datetime
+from collections import OrderedDict
 import time
 
 # API URL - change if your API is running on a different host/port
 API_URL = "http://localhost:8000"
 
+# Timeouts in seconds; answering and ingesting documents can take a while
+REQUEST_TIMEOUT = 10
+QUERY_TIMEOUT = 120
+UPLOAD_TIMEOUT = 600
+
+@st.cache_resource(show_spinner=False)
+def get_session():
+    """Create one pooled HTTP session that survives Streamlit reruns"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Reuse keep-alive connections to the API across calls
+SESSION = get_session()
+
 st.set_page_config(
     page_title="StudyRAG Assistant",
     page_icon="📚",
@@ -89,11 +109,13 @@ if 'search_results' not in st.session_state:
 if 'current_page' not in st.session_state:
     st.session_state.current_page = "Chat with Documents"
 if 'recent_searches' not in st.session_state:
-    st.session_state.recent_searches = []
+    st.session_state.recent_searches = OrderedDict()
 if 'search_query' not in st.session_state:
     st.session_state.search_query = ""
 if 'filtered_suggestions' not in st.session_state:
     st.session_state.filtered_suggestions = []
+if 'suggestion_index' not in st.session_state:
+    st.session_state.suggestion_index = set()
 
 
 faq_data = [
@@ -119,33 +141,61 @@ faq_data = [
     }
 ]
 
-def load_documents():
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_documents():
+    """Fetch the document list from the API, cached briefly across reruns"""
+    response = SESSION.get(f"{API_URL}/documents", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()["documents"]
+
+def load_documents(refresh=False):
     """Load documents from the API"""
+    if refresh:
+        fetch_documents.clear()
     try:
-        response = requests.get(f"{API_URL}/documents")
-        if response.status_code == 200:
-            st.session_state.documents = response.json()["documents"]
-            return response.json()["documents"]
-        else:
-            st.error(f"Error loading documents: {response.text}")
-            return []
+        documents = fetch_documents()
+    except requests.HTTPError as e:
+        st.error(f"Error loading documents: {e.response.text}")
+        return []
     except Exception as e:
         st.error(f"Error connecting to API: {str(e)}")
         return []
+    st.session_state.documents = documents
+    return documents
+
+@st.cache_data(ttl=10, show_spinner=False)
+def api_status():
+    """Return the API health probe status code, or None if unreachable"""
+    try:
+        return SESSION.get(f"{API_URL}/", timeout=1).status_code
+    except Exception:
+        return None
 
 def delete_document(filename):
     """Delete a document via the API"""
     try:
-        response = requests.delete(f"{API_URL}/documents/{filename}")
+        response = SESSION.delete(f"{API_URL}/documents/{filename}", timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             st.success(f"Deleted {filename}")
             # Refresh document list
-            load_documents()
+            load_documents(refresh=True)
         else:
             st.error(f"Error deleting document: {response.text}")
     except Exception as e:
         st.error(f"Error connecting to API: {str(e)}")
 
+def wait_for_upload(job_id, poll_interval=1.0):
+    """Poll an upload job until it finishes; returns None if it is still running at the timeout"""
+    deadline = time.monotonic() + UPLOAD_TIMEOUT
+    while time.monotonic() < deadline:
+        response = SESSION.get(f"{API_URL}/upload/status/{job_id}", timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+        if result["status"] in ("done", "failed"):
+            return result
+        time.sleep(poll_interval)
+    return None
+
 def format_timestamp(timestamp):
     """Format a timestamp into a readable date string"""
     return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
@@ -162,6 +212,15 @@ def change_page(page_name):
     st.session_state.current_page = page_name
     st.rerun()
 
+def add_recent_search(text):
+    """Move text to the front of the recent searches, keeping the 10 most recent"""
+    recent = st.session_state.recent_searches
+    recent.pop(text, None)
+    recent[text] = None
+    while len(recent) > 10:
+        recent.popitem(last=False)
+    st.session_state.suggestion_index.add(text)
+
 def update_search_suggestions():
     """Update search suggestions based on current query"""
     if st.session_state.current_page == "Chat with Documents":
@@ -173,22 +232,14 @@ def update_search_suggestions():
         st.session_state.filtered_suggestions = []
         return
     
-    # Combine recent searches and previous questions for suggestions
-    all_suggestions = set()
-    
-    # Add recent searches
-    for search in st.session_state.recent_searches:
-        all_suggestions.add(search)
-    
-    # Add previous questions
-    for item in st.session_state.query_history:
-        all_suggestions.add(item["question"])
-    
-    # Filter suggestions based on query
-    st.session_state.filtered_suggestions = [
-        suggestion for suggestion in all_suggestions 
-        if query in suggestion.lower()
-    ][:5]  # Limit to 5 suggestions
+    # Match against every past search and question, stopping at 5 suggestions
+    suggestions = []
+    for suggestion in st.session_state.suggestion_index:
+        if query in suggestion.lower():
+            suggestions.append(suggestion)
+            if len(suggestions) == 5:
+                break
+    st.session_state.filtered_suggestions = suggestions
 
 def use_suggestion(suggestion):
     """Use a suggestion as the query"""
@@ -211,13 +262,12 @@ This application uses RAG (Retrieval-Augmented Generation) to answer questions b
 """)
 
 # Check API status
-try:
-    response = requests.get(f"{API_URL}/")
-    if response.status_code == 200:
-        st.sidebar.success("✅ API Connected")
-    else:
-        st.sidebar.error("❌ API Error")
-except:
+status_code = api_status()
+if status_code == 200:
+    st.sidebar.success("✅ API Connected")
+elif status_code is not None:
+    st.sidebar.error("❌ API Error")
+else:
     st.sidebar.error("❌ API Not Available")
 
 st.sidebar.markdown("---")
@@ -274,10 +324,7 @@ if st.session_state.current_page == "Chat with Documents":
     
     if submitted and user_question:
         # Add to recent searches
-        if user_question not in st.session_state.recent_searches:
-            st.session_state.recent_searches.insert(0, user_question)
-            if len(st.session_state.recent_searches) > 10:
-                st.session_state.recent_searches.pop()
+        add_recent_search(user_question)
         
         with st.spinner("Generating response..."):
             try:
@@ -286,9 +333,10 @@ if st.session_state.current_page == "Chat with Documents":
                     "max_sources": max_sources
                 }
                 
-                response = requests.post(
+                response = SESSION.post(
                     f"{API_URL}/query",
-                    json=payload
+                    json=payload,
+                    timeout=QUERY_TIMEOUT
                 )
                 
                 if response.status_code == 200:
@@ -299,6 +347,7 @@ if st.session_state.current_page == "Chat with Documents":
                         "response": result,
                         "timestamp": time.time()
                     })
+                    st.session_state.suggestion_index.add(user_question)
                 else:
                     st.error(f"Error: {response.text}")
             except Exception as e:
@@ -350,18 +399,29 @@ elif st.session_state.current_page == "Upload Documents":
             if st.button("Process Document"):
                 with st.spinner("Uploading and processing document..."):
                     try:
-                        files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+                        # Stream the multipart body from the file object instead of building it in memory
+                        uploaded_file.seek(0)
+                        encoder = MultipartEncoder(
+                            fields={"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
+                        )
                         
-                        response = requests.post(
+                        response = SESSION.post(
                             f"{API_URL}/upload",
-                            files=files
+                            data=encoder,
+                            headers={"Content-Type": encoder.content_type},
+                            timeout=UPLOAD_TIMEOUT
                         )
                         
-                        if response.status_code == 200:
-                            result = response.json()
-                            st.success(f"Successfully uploaded {result['filename']} and processed {result['sections_processed']} sections!")
-                            # Refresh document list
-                            load_documents()
+                        if response.status_code == 202:
+                            result = wait_for_upload(response.json()["job_id"])
+                            if result is None:
+                                st.warning("Document is still being processed. Check back shortly.")
+                            elif result["status"] == "done":
+                                st.success(f"Successfully uploaded {result['filename']} and processed {result['sections_processed']} sections!")
+                                # Refresh document list
+                                load_documents(refresh=True)
+                            else:
+                                st.error(f"Error: {result['detail']}")
                         else:
                             st.error(f"Error: {response.text}")
                     except Exception as e:
@@ -383,7 +443,7 @@ elif st.session_state.current_page == "Manage Documents":
     
     # Refresh button
     if st.button("Refresh Document List"):
-        load_documents()
+        load_documents(refresh=True)
     
     documents = load_documents()
     
@@ -434,16 +494,14 @@ elif st.session_state.current_page == "Search Documents":
     if st.button("Search", key="search_button"):
         if search_query:
             # Add to recent searches
-            if search_query not in st.session_state.recent_searches:
-                st.session_state.recent_searches.insert(0, search_query)
-                if len(st.session_state.recent_searches) > 10:
-                    st.session_state.recent_searches.pop()
+            add_recent_search(search_query)
                     
             with st.spinner("Searching documents..."):
                 try:
-                    response = requests.get(
+                    response = SESSION.get(
                         f"{API_URL}/search",
-                        params={"query": search_query, "limit": search_limit}
+                        params={"query": search_query, "limit": search_limit},
+                        timeout=REQUEST_TIMEOUT
                     )
                     
                     if response.status_code == 200:
@@ -468,7 +526,7 @@ elif st.session_state.current_page == "Search Documents":
     if st.session_state.recent_searches:
         st.markdown("---")
         st.markdown("### Recent Searches")
-        for i, search in enumerate(st.session_state.recent_searches):
+        for i, search in enumerate(reversed(st.session_state.recent_searches)):
             if st.button(f"🔄 {search}", key=f"recent_{i}", use_container_width=True):
                 st.session_state.search_query = search
                 st.rerun()
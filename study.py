@@ -1,127 +1,485 @@
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.text_splitter import TokenTextSplitter
 from langchain.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.embeddings import Embeddings
 from langchain.docstore.document import Document
 import re
 import os
-from typing import List, Dict
-from langchain_chroma import Chroma
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import multiprocessing
+import queue
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader,UnstructuredPowerPointLoader ,TextLoader
-import json
+import orjson
+from query_cache import QueryCache
+from vector_backends import VectorBackend, ChromaBackend, FaissFlatBackend
+
+# PyMuPDF extracts text much faster than pypdf; fall back if it isn't installed.
+# Loader, model and vector store libraries are imported on first use to keep startup fast.
+PYMUPDF_AVAILABLE = importlib.util.find_spec("fitz") is not None
 
 load_dotenv()
 
-class StudyDocumentProcessor:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1024, 
-            chunk_overlap=200, 
-            add_start_index=True
-        )
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+# Number of chunks sent to the embedding API per request during ingestion
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+# Number of embedding requests allowed in flight at once
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "8"))
+EMBED_MAX_RETRIES = 5
+# Split chunks buffered between the parsing thread and the embedding loop
+PIPELINE_QUEUE_SIZE = 64
+
+# Vector store implementation: "chroma" (default) or "faiss" for a flat in-memory index
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma").lower()
+CHROMA_PERSIST_DIR = "chroma_db_study"
+# LangChain's default collection name, kept so existing stores still load
+CHROMA_COLLECTION = "langchain"
+FAISS_PERSIST_DIR = "faiss_db_study"
+
+# HNSW parameters, applied when the collection is first created; raise
+# CHROMA_SEARCH_EF for better recall at the cost of search latency
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": int(os.environ.get("CHROMA_SEARCH_EF", "64"))
+}
+
+# Query embeddings shared by every StudyRAG in the process; vectors only depend on model and text
+EMBEDDING_CACHE = QueryCache(max_size=2048, ttl_seconds=None)
+
+# Answers persisted across runs; entries are keyed under a version bumped whenever new chunks are stored
+QA_CACHE_TTL_SECONDS = 7 * 24 * 3600
+QA_CACHE_VERSION_KEY = "version"
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Worker processes are spawned rather than forked: callers run on background threads
+# next to grpc clients and SQLite connections, which a fork can copy mid-use
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# PDFs with at least this many pages are extracted across worker processes
+PDF_PARALLEL_MIN_PAGES = 20
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """Check whether an error, or any error it was raised from, is an HTTP 429"""
+    from google.api_core.exceptions import ResourceExhausted
+
+    while error is not None:
+        if isinstance(error, ResourceExhausted) or "429" in str(error):
+            return True
+        error = error.__cause__
+    return False
+
+
+def _batched(iterable: Iterable, n: int):
+    """Yield successive lists of up to n items from iterable"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that memoizes query vectors by SHA-256 of model and text"""
+
+    def __init__(self, embeddings: Embeddings, cache: QueryCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = getattr(embeddings, "model", "")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = hashlib.sha256(f"{self.model}\0{text}".encode()).hexdigest()
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+
+def _extract_page_range(args) -> List[Document]:
+    """Extract a contiguous block of pages; opens its own handle since fitz documents can't be pickled"""
+    import fitz
+
+    path, start, stop = args
+    with fitz.open(path) as pdf:
+        # Same metadata keys PyMuPDFLoader sets, so chunks look alike whichever path loaded them
+        document_metadata = {k: v for k, v in pdf.metadata.items() if isinstance(v, (str, int))}
+        return [
+            Document(
+                page_content=pdf[i].get_text(),
+                metadata={
+                    "source": path,
+                    "file_path": path,
+                    "page": i,
+                    "total_pages": pdf.page_count,
+                    **document_metadata
+                }
+            )
+            for i in range(start, stop)
+        ]
+
+
+def _extract_pdf_parallel(path: str, page_count: int) -> Iterator[Document]:
+    """Extract a PDF one block of pages per worker process, yielding pages in order as each block finishes"""
+    workers = max(1, min((os.cpu_count() or 2) - 1, page_count))
+    step = -(-page_count // workers)
+    blocks = [(path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    with ProcessPoolExecutor(max_workers=len(blocks), mp_context=MP_CONTEXT) as pool:
+        for block in pool.map(_extract_page_range, blocks):
+            yield from block
+
+
+@functools.lru_cache(maxsize=1)
+def _get_text_splitter() -> TokenTextSplitter:
+    """Shared splitter for the process; loading the tiktoken encoding may download it, so it happens on first use"""
+    # Token windows are cut by tiktoken's native tokenizer rather than recursive Python splitting.
+    # add_start_index is left off: LangChain subtracts the token overlap from a character
+    # offset, so the recorded start_index would be wrong (often -1) for every chunk after the first.
+    return TokenTextSplitter(
+        encoding_name="cl100k_base",
+        chunk_size=512, 
+        chunk_overlap=64
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_embeddings() -> CachedEmbeddings:
+    """Shared embedder for the process, created on first use"""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return CachedEmbeddings(
+        GoogleGenerativeAIEmbeddings(
             model="models/embedding-001",
             google_api_key=os.environ["GOOGLE_API_KEY"]
-        )
-        self.chroma_persist_dir = "chroma_db_study"
+        ),
+        EMBEDDING_CACHE
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_chroma_client():
+    """Single persistent Chroma client for the process, so the SQLite file and HNSW index load once"""
+    import chromadb
+
+    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_vectorstore() -> VectorBackend:
+    """Shared vector backend for the process, opened on first use"""
+    if VECTOR_BACKEND == "faiss":
+        return FaissFlatBackend(FAISS_PERSIST_DIR)
+    from langchain_chroma import Chroma
+
+    return ChromaBackend(Chroma(
+        client=_get_chroma_client(),
+        collection_name=CHROMA_COLLECTION,
+        embedding_function=_get_embeddings(),
+        collection_metadata=HNSW_METADATA
+    ))
+
+
+class ChunkDeduplicator:
+    """Tracks hashes of whitespace/case-normalized chunk text already in the store"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.seen = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.seen.update(line.strip() for line in f)
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(_WHITESPACE.sub(" ", text.lower()).strip().encode()).hexdigest()
+
+    def reserve(self, texts: List[Document]) -> Tuple[List[Document], List[str]]:
+        """Claim unseen chunks, returning them with their hashes and dropping duplicates"""
+        unique, hashes = [], []
+        with self._lock:
+            for text in texts:
+                digest = self._hash(text.page_content)
+                if digest in self.seen:
+                    continue
+                self.seen.add(digest)
+                unique.append(text)
+                hashes.append(digest)
+        return unique, hashes
+
+    def release(self, hashes: List[str]):
+        """Forget reserved hashes whose chunks failed to store"""
+        with self._lock:
+            self.seen.difference_update(hashes)
+
+    def commit(self, hashes: List[str]):
+        """Persist hashes of chunks that were stored"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.writelines(digest + "\n" for digest in hashes)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_deduplicator() -> ChunkDeduplicator:
+    """Shared chunk deduplicator for the process, stored next to the vectors"""
+    persist_dir = FAISS_PERSIST_DIR if VECTOR_BACKEND == "faiss" else CHROMA_PERSIST_DIR
+    return ChunkDeduplicator(os.path.join(persist_dir, "seen_hashes.txt"))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_qa_cache():
+    """Shared on-disk answer cache for the process, stored next to the vectors"""
+    from diskcache import Cache
+
+    persist_dir = FAISS_PERSIST_DIR if VECTOR_BACKEND == "faiss" else CHROMA_PERSIST_DIR
+    return Cache(os.path.join(persist_dir, ".qa_cache"))
+
+
+def _qa_cache_key(qa_cache, question: str, k: int) -> str:
+    """Cache key for a question under the current store version and answer settings"""
+    version = qa_cache.get(QA_CACHE_VERSION_KEY, 0)
+    digest = hashlib.sha256(f"{k}\0{question}".encode("utf-8")).hexdigest()
+    return f"{version}:{QA_CACHE_TAG}:{digest}"
+
+
+def iter_documents(input_file: str, parallel_pdf: bool = True) -> Iterator[Document]:
+    """Lazily load a study file into Documents based on its extension
+
+    parallel_pdf=False keeps large PDFs in this process; callers already running
+    in a worker pool pass it so they don't each start another pool.
+    """
+    file_extension = os.path.splitext(input_file)[1].lower()
+    
+    # Handle different file types
+    if file_extension == '.pdf':
+        if PYMUPDF_AVAILABLE:
+            import fitz
+            from langchain_community.document_loaders import PyMuPDFLoader as PDFLoader
+
+            with fitz.open(input_file) as pdf:
+                page_count = pdf.page_count
+        else:
+            from langchain_community.document_loaders import PyPDFLoader as PDFLoader
+
+            page_count = 0
+        if parallel_pdf and page_count >= PDF_PARALLEL_MIN_PAGES:
+            yield from _extract_pdf_parallel(input_file, page_count)
+        else:
+            loader = PDFLoader(input_file)
+            yield from loader.lazy_load()
+
+    elif file_extension in ['.ppt', '.pptx']:
+        from langchain_community.document_loaders import UnstructuredPowerPointLoader
+
+        loader = UnstructuredPowerPointLoader(input_file)
+        yield from loader.lazy_load()
+    elif file_extension == '.txt':
+        from langchain_community.document_loaders import TextLoader
+
+        loader = TextLoader(input_file)
+        yield from loader.lazy_load()
+    elif file_extension == '.json':
+        with open(input_file, 'rb') as f:
+            data = orjson.loads(f.read())
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if isinstance(value, str):
+                    yield Document(
+                        page_content=value,
+                        metadata={"source": input_file, "key": key}
+                    )
+        elif isinstance(data, list):
+            for item in data:
+                if isinstance(item, str):
+                    yield Document(
+                        page_content=item,
+                        metadata={"source": input_file}
+                    )
+
+
+def load_documents(input_file: str, parallel_pdf: bool = True) -> List[Document]:
+    """Load a study file into Documents based on its extension"""
+    return list(iter_documents(input_file, parallel_pdf))
+
+
+def load_and_split(input_file: str, parallel_pdf: bool = True) -> List[Document]:
+    """Load and split a study file; CPU-only, so it can run in a worker process"""
+    return _get_text_splitter().split_documents(load_documents(input_file, parallel_pdf))
+
+
+class StudyDocumentProcessor:
+    __slots__ = ("embeddings", "chroma_persist_dir", "vectorstore", "deduplicator")
+
+    def __init__(self):
+        self.embeddings = _get_embeddings()
+        self.chroma_persist_dir = CHROMA_PERSIST_DIR
+        self.deduplicator = _get_deduplicator()
         self.vectorstore = None
         self.initialize_vectorstore()
 
     def initialize_vectorstore(self):
-        if os.path.exists(self.chroma_persist_dir):
-            self.vectorstore = Chroma(
-                persist_directory=self.chroma_persist_dir,
-                embedding_function=self.embeddings
-            )
-        else:
-            self.vectorstore = Chroma(
-                persist_directory=self.chroma_persist_dir,
-                embedding_function=self.embeddings
-            )
+        self.vectorstore = _get_vectorstore()
+
+    def process_document(self, input_file: str) -> int:
+        """Ingest one study file; returns how many sections were stored"""
+        return asyncio.run(self._aprocess_document(input_file))
 
-    def process_document(self, input_file: str):
+    async def _aprocess_document(self, input_file: str) -> int:
         try:
-            documents = []
-            file_extension = os.path.splitext(input_file)[1].lower()
+            total, stored = await self._apipeline(input_file)
             
-            # Handle different file types
-            if file_extension == '.pdf':
-                loader = PyPDFLoader(input_file)
-                documents.extend(loader.load())
-
-            elif file_extension in ['.ppt', '.pptx']:
-                loader = UnstructuredPowerPointLoader(input_file)
-                documents.extend(loader.load())
-            elif file_extension == '.txt':
-                loader = TextLoader(input_file)
-                documents.extend(loader.load())
-            elif file_extension == '.json':
-                with open(input_file, 'r') as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        for key, value in data.items():
-                            if isinstance(value, str):
-                                documents.append(Document(
-                                    page_content=value,
-                                    metadata={"source": input_file, "key": key}
-                                ))
-                    elif isinstance(data, list):
-                        for item in data:
-                            if isinstance(item, str):
-                                documents.append(Document(
-                                    page_content=item,
-                                    metadata={"source": input_file}
-                                ))
-            
-            if not documents:
+            if not total:
                 print(f"No documents loaded from {input_file}")
-                return
-            
-            # Split documents
-            texts = self.text_splitter.split_documents(documents)
-            
-            # Add to vectorstore
-            self.vectorstore.add_documents(texts)
+                return 0
             
-            print(f"Processed {len(texts)} sections from {input_file}")
+            print(f"Processed {stored} sections from {input_file} ({total - stored} duplicates skipped)")
+            return stored
             
         except Exception as e:
             print(f"Error processing document: {e}")
             raise
 
+    async def _apipeline(self, input_file: str) -> Tuple[int, int]:
+        """Embed batches while later pages are still being parsed; returns (chunks split, chunks stored)"""
+        chunks = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        
+        def produce():
+            # A sentinel (or the error) always ends the queue so the consumer never hangs
+            try:
+                text_splitter = _get_text_splitter()
+                for document in iter_documents(input_file):
+                    for chunk in text_splitter.split_documents([document]):
+                        chunks.put(chunk)
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+        
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        tasks = []
+        total = 0
+        batch = []
+        while True:
+            chunk = await asyncio.to_thread(chunks.get)
+            if isinstance(chunk, Exception):
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise chunk
+            if chunk is not None:
+                batch.append(chunk)
+                total += 1
+            if batch and (chunk is None or len(batch) == EMBED_BATCH_SIZE):
+                tasks.append(asyncio.create_task(self.embed_and_store(batch, semaphore)))
+                batch = []
+            if chunk is None:
+                break
+        
+        await producer
+        return total, sum(await asyncio.gather(*tasks))
+
+    async def embed_and_store(self, texts: List[Document], semaphore: Optional[asyncio.Semaphore] = None) -> int:
+        """Embed split chunks not seen before and write them to the vector store; returns how many were stored"""
+        texts, hashes = self.deduplicator.reserve(texts)
+        if not texts:
+            return 0
+        
+        try:
+            # Embed all batches concurrently, then write them to the store together
+            embeddings = await self._aembed_texts(texts, semaphore)
+            self.vectorstore.add(embeddings, texts)
+        except Exception:
+            self.deduplicator.release(hashes)
+            raise
+        
+        self.deduplicator.commit(hashes)
+        # New material can change answers, so retire every cached one
+        _get_qa_cache().incr(QA_CACHE_VERSION_KEY, default=0)
+        return len(texts)
+
+    async def _aembed_texts(self, texts: List[Document], semaphore: Optional[asyncio.Semaphore] = None) -> List[List[float]]:
+        """Embed chunks in batches, keeping at most EMBED_CONCURRENCY requests in flight"""
+        semaphore = semaphore or asyncio.Semaphore(EMBED_CONCURRENCY)
+        batches = [[t.page_content for t in batch] for batch in _batched(texts, EMBED_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._aembed_batch(batch, semaphore) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
+    async def _aembed_batch(self, batch: List[str], semaphore: asyncio.Semaphore) -> List[List[float]]:
+        """Embed one batch, retrying rate-limit errors with exponential backoff and jitter"""
+        async with semaphore:
+            for attempt in range(EMBED_MAX_RETRIES):
+                try:
+                    return await self.embeddings.aembed_documents(batch)
+                except Exception as e:
+                    if attempt == EMBED_MAX_RETRIES - 1 or not _is_rate_limited(e):
+                        raise
+                    await asyncio.sleep(2 ** attempt + random.uniform(0, 1))
+
+
+ANSWER_TEMPLATE = """
+        You are a helpful study assistant. Answer the following question based on the provided documents.
+        
+        REFERENCE DOCUMENTS:
+        {context}
+        
+        QUESTION: {query}
+        
+        Provide a comprehensive but concise answer. Only use information from the provided documents.
+        Do not include 'Document from' or other reference markers in your answer.
+        """
+
+
+CHAT_MODEL = "gemini-1.5-pro"
+CHAT_TEMPERATURE = 0.3
+
+# Changing the model, temperature or prompt changes the tag, so old answers stop matching
+QA_CACHE_TAG = hashlib.sha256(
+    f"{CHAT_MODEL}\0{CHAT_TEMPERATURE}\0{ANSWER_TEMPLATE}".encode("utf-8")
+).hexdigest()[:16]
+
 
 class StudyRAG:
+    __slots__ = ("embeddings", "chroma_persist_dir", "vectorstore", "model", "prompt", "qa_cache")
+
     def __init__(self):
-        self.chroma_persist_dir = "chroma_db_study"
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=os.environ["GOOGLE_API_KEY"]
-        )
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.embeddings = _get_embeddings()
+        self.chroma_persist_dir = CHROMA_PERSIST_DIR
         self.vectorstore = None
         self.initialize_vectorstore()
+        # One chat client per instance so its channel is reused across questions
+        self.model = ChatGoogleGenerativeAI(
+            model=CHAT_MODEL, 
+            temperature=CHAT_TEMPERATURE,
+            google_api_key=os.environ["GOOGLE_API_KEY"]
+        )
+        self.prompt = PromptTemplate.from_template(ANSWER_TEMPLATE)
+        self.qa_cache = _get_qa_cache()
         
     def initialize_vectorstore(self):
-        if os.path.exists(self.chroma_persist_dir):
-            self.vectorstore = Chroma(
-                persist_directory=self.chroma_persist_dir,
-                embedding_function=self.embeddings
-            )
-        else:
-            self.vectorstore = Chroma(
-                persist_directory=self.chroma_persist_dir,
-                embedding_function=self.embeddings
-            )
+        self.vectorstore = _get_vectorstore()
+
+    def count(self) -> int:
+        """Number of sections stored in the vector store"""
+        return self.vectorstore.count()
 
     def search_documents(self, query: str, k: int = 3):
         """Search for relevant documents and return them with their sources"""
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": k}
-        )
-        
-        docs = retriever.invoke(query)
+        docs = self.vectorstore.search(self.embeddings.embed_query(query), k=k)
         results = []
         
         for doc in docs:
@@ -137,57 +495,37 @@ class StudyRAG:
         
         return results
 
-    def get_response_with_sources(self, question: str) -> Dict:
-        """Get AI response along with source documents"""
+    def _build_chain(self, context: str):
+        """Build the prompt -> model chain answering a question from a fixed context"""
+        return (
+            {
+                "context": lambda _: context,
+                "query": RunnablePassthrough()
+            }
+            | self.prompt
+            | self.model
+            | StrOutputParser()
+        )
+
+    def get_response_with_sources(self, question: str, k: int = 3, use_cache: bool = True) -> Dict:
+        """Get AI response along with the k most relevant source documents
+
+        use_cache=False skips the on-disk answer cache lookup; the fresh answer is still stored.
+        """
         try:
-            # Search for relevant documents
-            docs = self.search_documents(question)
-            
-            retriever = self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 3}
-            )
+            key = _qa_cache_key(self.qa_cache, question, k)
+            result = self.qa_cache.get(key) if use_cache else None
+            if result is not None:
+                return result
 
-            # Extract document content for the prompt
-            doc_contents = "\n\n".join([f"Document from {doc['source']}:\n{doc['content']}" for doc in docs])
+            # Search for relevant documents once and reuse them as the prompt context
+            docs = self.search_documents(question, k=k)
+            context = "\n\n".join(doc["content"] for doc in docs)
             
-            model = ChatGoogleGenerativeAI(
-                model="gemini-1.5-pro", 
-                temperature=0.3,
-                google_api_key=os.environ["GOOGLE_API_KEY"]
-            )
-            
-            template = """
-            You are a helpful study assistant. Answer the following question based on the provided documents.
-            
-            REFERENCE DOCUMENTS:
-            {context}
-            
-            QUESTION: {query}
-            
-            Provide a comprehensive but concise answer. Only use information from the provided documents.
-            Do not include 'Document from' or other reference markers in your answer.
-            """
-            
-            prompt = PromptTemplate.from_template(template)
-            
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-            
-            rag_chain = (
-                {
-                    "context": lambda x: format_docs(retriever.invoke(x["query"])),
-                    "query": RunnablePassthrough()
-                }
-                | prompt
-                | model
-                | StrOutputParser()
-            )
-            
-            response = rag_chain.invoke({"query": question})
+            response = self._build_chain(context).invoke(question)
             
             # Return both the answer and source documents
-            return {
+            result = {
                 "answer": response,
                 "sources": docs
             }   
@@ -198,6 +536,28 @@ class StudyRAG:
                 "sources": []
             }
 
+        self.qa_cache.set(key, result, expire=QA_CACHE_TTL_SECONDS)
+        return result
+
+    def get_response_with_sources_stream(self, question: str, k: int = 3) -> Tuple[Iterator[str], List[Dict]]:
+        """Retrieve sources up front and return them with an iterator over the answer's text chunks"""
+        key = _qa_cache_key(self.qa_cache, question, k)
+        cached = self.qa_cache.get(key)
+        if cached is not None:
+            return iter([cached["answer"]]), cached["sources"]
+
+        docs = self.search_documents(question, k=k)
+        context = "\n\n".join(doc["content"] for doc in docs)
+        return self._stream_and_cache(key, self._build_chain(context).stream(question), docs), docs
+
+    def _stream_and_cache(self, key: str, stream: Iterator[str], docs: List[Dict]) -> Iterator[str]:
+        """Pass answer chunks through, caching the full answer once the stream completes"""
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        self.qa_cache.set(key, {"answer": "".join(chunks), "sources": docs}, expire=QA_CACHE_TTL_SECONDS)
+
 
 def process_files(rag_processor, directory="study_materials"):
     """Process all files in the given directory"""
@@ -206,20 +566,53 @@ def process_files(rag_processor, directory="study_materials"):
         print(f"Created directory {directory}, please add your study materials there.")
         return
         
-    for filename in os.listdir(directory):
-        if filename.endswith(('.pdf', '.txt', '.json', '.ppt', '.pptx')):
-            file_path = os.path.join(directory, filename)
+    file_paths = [
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if filename.endswith(('.pdf', '.txt', '.json', '.ppt', '.pptx'))
+    ]
+    if not file_paths:
+        return
+
+    # Parse files in worker processes and embed each one as soon as it is split;
+    # the pool already uses every core, so workers extract large PDFs serially
+    max_workers = max(1, (os.cpu_count() or 2) - 1)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=MP_CONTEXT) as pool:
+        futures = {pool.submit(load_and_split, file_path, False): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
             print(f"Processing {file_path}...")
-            rag_processor.process_document(file_path)
+            texts = future.result()
+            if not texts:
+                print(f"No documents loaded from {file_path}")
+                continue
+            stored = asyncio.run(rag_processor.embed_and_store(texts))
+            print(f"Processed {stored} sections from {file_path} ({len(texts) - stored} duplicates skipped)")
+
+
+# One numbered source entry; filled with str.format for every snippet shown
+SOURCE_TEMPLATE = "{i}. From {source}:\n   {snippet}{ellipsis}\n\n"
 
 
 def format_sources(sources):
     """Format source documents for display"""
-    result = "\nSOURCES:\n"
-    for i, doc in enumerate(sources, 1):
-        result += f"{i}. From {doc['source']}:\n"
-        result += f"   {doc['content'][:200]}{'...' if len(doc['content']) > 200 else ''}\n\n"
-    return result
+    return "\nSOURCES:\n" + "".join(
+        SOURCE_TEMPLATE.format(
+            i=i,
+            source=doc["source"],
+            snippet=doc["content"][:200],
+            ellipsis="..." if len(doc["content"]) > 200 else ""
+        )
+        for i, doc in enumerate(sources, 1)
+    )
+
+
+def _report_ingestion(future):
+    """Print the outcome of background document processing"""
+    if future.exception() is not None:
+        print(f"\nError processing documents: {future.exception()}")
+    else:
+        print("\nAll documents indexed.")
 
 
 def main():
@@ -227,28 +620,42 @@ def main():
     processor = StudyDocumentProcessor()
     rag = StudyRAG()
     
-    # Process documents if needed
-    if not os.path.exists("chroma_db_study") or not os.listdir("chroma_db_study"):
-        print("No existing database found. Processing documents...")
-        process_files(processor)
+    # Process documents in the background if needed, so questions can be asked right away
+    ingestion = None
+    if rag.count() == 0:
+        print("No existing database found. Processing documents in the background...")
+        executor = ThreadPoolExecutor(max_workers=1)
+        ingestion = executor.submit(process_files, processor)
+        ingestion.add_done_callback(_report_ingestion)
+        executor.shutdown(wait=False)
     
     print("\nStudy Assistant Ready!")
     
     while True:
         question = input("\nQuestion (type 'exit' to quit): ")
         if question.lower() in ['exit', 'quit']:
+            if ingestion is not None and not ingestion.done():
+                print("Waiting for document processing to finish...")
+                wait([ingestion])
             break
         
         print("\nSearching knowledge base...")
-        result = rag.get_response_with_sources(question)
+        try:
+            stream, sources = rag.get_response_with_sources_stream(question)
+            
+            print("\n----- ANSWER -----")
+            for chunk in stream:
+                print(chunk, end="", flush=True)
+            print()
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            continue
         
-        print("\n----- ANSWER -----")
-        print(result["answer"])
         print("\n----- SOURCES -----")
-        for i, source in enumerate(result["sources"], 1):
-            print(f"{i}. From {source['source']}:")
-            print(f"   {source['content'][:100]}...")
-            print()
+        print("".join(
+            SOURCE_TEMPLATE.format(i=i, source=source["source"], snippet=source["content"][:100], ellipsis="...")
+            for i, source in enumerate(sources, 1)
+        ), end="")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import uuid
+from typing import TYPE_CHECKING, List, Protocol
+
+import numpy as np
+from langchain.docstore.document import Document
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+
+class VectorBackend(Protocol):
+    """Storage and nearest-neighbour search over precomputed embeddings"""
+
+    def add(self, embeddings: List[List[float]], documents: List[Document]): ...
+
+    def search(self, vector: List[float], k: int) -> List[Document]: ...
+
+    def count(self) -> int: ...
+
+
+class ChromaBackend:
+    """Vector backend on top of a LangChain Chroma store"""
+
+    def __init__(self, vectorstore: "Chroma"):
+        self.vectorstore = vectorstore
+        self._write_lock = threading.Lock()
+
+    def add(self, embeddings: List[List[float]], documents: List[Document]):
+        max_batch_size = self.vectorstore._client.get_max_batch_size()
+        # Serialize writers so concurrent ingestion doesn't contend on the SQLite file
+        with self._write_lock:
+            for start in range(0, len(documents), max_batch_size):
+                batch = documents[start:start + max_batch_size]
+                self.vectorstore._collection.add(
+                    ids=[uuid.uuid4().hex for _ in batch],
+                    embeddings=embeddings[start:start + max_batch_size],
+                    documents=[d.page_content for d in batch],
+                    metadatas=[d.metadata for d in batch]
+                )
+
+    def search(self, vector: List[float], k: int) -> List[Document]:
+        return self.vectorstore.similarity_search_by_vector(vector, k=k)
+
+    def count(self) -> int:
+        return self.vectorstore._collection.count()
+
+
+class FaissFlatBackend:
+    """Exhaustive inner-product search with FAISS over L2-normalized vectors
+
+    Vectors are held and persisted as float16, halving memory and the bytes
+    scanned per search; fp16 scalar quantization needs no training, so the
+    index can grow incrementally. Each add appends raw rows to vectors.f16 and
+    chunk text and metadata to a JSONL sidecar, so ingestion never rewrites
+    what is already stored. On startup the rows are read back in blocks
+    through a memory map.
+    """
+
+    # Rows converted to float32 at a time when rebuilding the index on startup
+    LOAD_BLOCK_ROWS = 65536
+
+    def __init__(self, persist_dir: str):
+        import faiss
+
+        self.faiss = faiss
+        self.persist_dir = persist_dir
+        self.vectors_path = os.path.join(persist_dir, "vectors.f16")
+        self.records_path = os.path.join(persist_dir, "records.jsonl")
+        self.meta_path = os.path.join(persist_dir, "meta.json")
+        self.index = None
+        self.records = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            dimension = json.load(f)["dimension"]
+
+        lines = []
+        if os.path.exists(self.records_path):
+            with open(self.records_path) as f:
+                lines = f.readlines()
+        # A line cut short by a crash has no newline and is dropped
+        records = [json.loads(line) for line in lines if line.endswith("\n")]
+        row_bytes = dimension * np.dtype(np.float16).itemsize
+        stored_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+
+        # Records are written before vectors, but trim both to the rows they share
+        # in case a crash left either one ahead of the other
+        rows = min(stored_rows, len(records))
+        self.records = records[:rows]
+        if rows != len(lines) or rows != stored_rows:
+            self._truncate(rows, row_bytes)
+
+        self.index = self._new_index(dimension)
+        if rows:
+            vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(rows, dimension))
+            for start in range(0, rows, self.LOAD_BLOCK_ROWS):
+                self.index.add(np.asarray(vectors[start:start + self.LOAD_BLOCK_ROWS], dtype=np.float32))
+            del vectors
+
+    def _truncate(self, rows: int, row_bytes: int):
+        """Cut both files back to the first rows entries"""
+        if os.path.exists(self.vectors_path):
+            os.truncate(self.vectors_path, rows * row_bytes)
+        with open(self.records_path, "w") as f:
+            f.writelines(json.dumps(record) + "\n" for record in self.records)
+
+    def _new_index(self, dimension: int):
+        return self.faiss.IndexScalarQuantizer(
+            dimension, self.faiss.ScalarQuantizer.QT_fp16, self.faiss.METRIC_INNER_PRODUCT
+        )
+
+    def add(self, embeddings: List[List[float]], documents: List[Document]):
+        vectors = np.array(embeddings, dtype=np.float32)
+        self.faiss.normalize_L2(vectors)
+        records = [{"content": d.page_content, "metadata": d.metadata} for d in documents]
+        with self._lock:
+            if self.index is None:
+                os.makedirs(self.persist_dir, exist_ok=True)
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dimension": vectors.shape[1]}, f)
+                self.index = self._new_index(vectors.shape[1])
+            # Records go first so a crash can only leave vectors behind, never ahead
+            try:
+                with open(self.records_path, "a") as f:
+                    f.writelines(json.dumps(record) + "\n" for record in records)
+                with open(self.vectors_path, "ab") as f:
+                    f.write(vectors.astype(np.float16).tobytes())
+            except Exception:
+                # Drop a half-written batch so later appends stay aligned
+                self._truncate(len(self.records), vectors.shape[1] * np.dtype(np.float16).itemsize)
+                raise
+            self.index.add(vectors)
+            self.records.extend(records)
+
+    def search(self, vector: List[float], k: int) -> List[Document]:
+        if self.index is None:
+            return []
+        query = np.array([vector], dtype=np.float32)
+        self.faiss.normalize_L2(query)
+        with self._lock:
+            _, indices = self.index.search(query, k)
+            return [
+                Document(page_content=self.records[i]["content"], metadata=self.records[i]["metadata"])
+                for i in indices[0] if i != -1
+            ]
+
+    def count(self) -> int:
+        return len(self.records)